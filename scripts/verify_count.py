@@ -13,5 +13,6 @@ if not MONGODB_URI:
 
 client = pymongo.MongoClient(MONGODB_URI)
 db = client["demo"]
-count = db["tweet_collection"].count_documents({})
+# Metadata read, O(1); count_documents({}) walks the whole collection
+count = db["tweet_collection"].estimated_document_count()
 print(f"demo.tweet_collection count: {count}")